@@ -5,11 +5,22 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date, time as dtime
+from zoneinfo import ZoneInfo
 import time
+import json
+import asyncio
+import threading
 import warnings
+import copy
+from collections import deque
 import yfinance as yf
 
+try:
+    import websockets  # Optionnel: uniquement pour les flux ws:// / wss://
+except ImportError:
+    websockets = None
+
 warnings.filterwarnings('ignore')
 
 # Configuration de la page
@@ -136,19 +147,869 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+class StreamingFeedConsumer:
+    """Consomme un flux de ticks poussé (WebSocket ou socket TCP local) dans une boucle asyncio dédiée.
+
+    Chaque message est une ligne JSON {"symbole", "prix", "volume", "ts"} (ou une liste de tels
+    objets). Les événements sont fusionnés par symbole jusqu'au prochain drain() : dernier prix,
+    volume cumulé, horodatage de la transaction la plus ancienne du lot pour mesurer la latence.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.connected = False
+        self.events_received = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._loop = None
+        self._task = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            asyncio.run(self._main())
+        except asyncio.CancelledError:
+            pass
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        if self._stop.is_set():
+            return
+        await self._consume_forever()
+
+    async def _consume_forever(self):
+        """Boucle de consommation avec reconnexion automatique"""
+        while not self._stop.is_set():
+            try:
+                if self.url.startswith(('ws://', 'wss://')):
+                    await self._consume_websocket()
+                else:
+                    await self._consume_socket()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            self.connected = False
+            await asyncio.sleep(1)
+
+    async def _consume_websocket(self):
+        if websockets is None:
+            raise RuntimeError("le paquet 'websockets' est requis pour les flux ws://")
+        async with websockets.connect(self.url) as ws:
+            self.connected = True
+            self.last_error = None
+            async for message in ws:
+                self._on_message(message)
+                if self._stop.is_set():
+                    break
+
+    async def _consume_socket(self):
+        # Format accepté: tcp://hote:port ou hote:port
+        host, _, port = self.url.replace('tcp://', '').rpartition(':')
+        reader, writer = await asyncio.open_connection(host or '127.0.0.1', int(port))
+        self.connected = True
+        self.last_error = None
+        try:
+            while not self._stop.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+                self._on_message(line)
+        finally:
+            writer.close()
+
+    def _on_message(self, message):
+        # Un message invalide est ignoré sans couper la connexion
+        try:
+            payload = json.loads(message)
+        except ValueError as e:
+            self.last_error = f"Message ignoré (JSON invalide): {e}"
+            return
+        events = payload if isinstance(payload, list) else [payload]
+        received_at = time.time()
+        with self.lock:
+            for event in events:
+                try:
+                    symbole = event['symbole']
+                    prix = float(event['prix'])
+                    volume = float(event.get('volume', 0))
+                    ts = float(event.get('ts', received_at))
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    self.last_error = f"Événement ignoré ({type(e).__name__}: {e})"
+                    continue
+                previous = self.pending.get(symbole)
+                self.pending[symbole] = {
+                    'prix': prix,
+                    'volume': volume + (previous['volume'] if previous else 0),
+                    'ts': ts,
+                    'ts_premier': previous['ts_premier'] if previous else ts,
+                    'nb_ticks': (previous['nb_ticks'] if previous else 0) + 1
+                }
+                self.events_received += 1
+
+    def drain(self):
+        """Retourne et vide les événements en attente (un par symbole)"""
+        with self.lock:
+            events, self.pending = self.pending, {}
+        return events
+
+    def stop(self):
+        """Arrête la consommation, y compris une lecture bloquée en attente de données"""
+        self._stop.set()
+        if self._loop is not None and self._task is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+            except RuntimeError:
+                pass  # Boucle déjà fermée
+
+
+class LocalTestFeed:
+    """Flux de test local: diffuse des ticks simulés (marche aléatoire) sur un socket TCP"""
+
+    def __init__(self, prix_initiaux, host='127.0.0.1', port=8765, ticks_par_seconde=20):
+        self.prix = dict(prix_initiaux)
+        self.host = host
+        self.port = port
+        self.ticks_par_seconde = ticks_par_seconde
+        self.clients = set()
+        self.error = None
+        self._loop = None
+        self._task = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+
+    @property
+    def url(self):
+        return f"tcp://{self.host}:{self.port}"
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except asyncio.CancelledError:
+            pass
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        try:
+            server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        except OSError as e:
+            self.error = f"Port {self.port} indisponible: {e}"
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            async with server:
+                await self._broadcast_forever()
+        finally:
+            # Fermer les connexions: les clients voient la fin du flux
+            for writer in list(self.clients):
+                writer.close()
+            self.clients.clear()
+
+    def stop(self):
+        """Arrête le serveur et déconnecte ses clients"""
+        if self._loop is not None and self._task is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+            except RuntimeError:
+                pass  # Boucle déjà fermée
+        self._thread.join(timeout=2)
+
+    async def _handle_client(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            await reader.read()  # Attendre la déconnexion du client
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def _broadcast_forever(self):
+        rng = np.random.default_rng()
+        symboles = list(self.prix.keys())
+        while True:
+            await asyncio.sleep(1 / self.ticks_par_seconde)
+            if not self.clients or not symboles:
+                continue
+            symbole = symboles[rng.integers(len(symboles))]
+            self.prix[symbole] *= 1 + rng.normal(0, 0.0005)
+            line = json.dumps({
+                'symbole': symbole,
+                'prix': round(self.prix[symbole], 4),
+                'volume': int(rng.integers(1, 500)),
+                'ts': time.time()
+            }) + '\n'
+            for writer in list(self.clients):
+                try:
+                    writer.write(line.encode())
+                except Exception:
+                    self.clients.discard(writer)
+
+
+@st.cache_data(ttl=300)
+def fetch_historical_data(ticker):
+    """Historique 7 jours en barres de 5 minutes, conservé en cache la durée d'une barre"""
+    return yf.Ticker(ticker).history(period='7d', interval='5m')
+
+
+class LiveMarketState:
+    """État live indexé par symbole, versionné, avec suivi des changements.
+
+    Les métadonnées statiques sont stockées une seule fois et seuls les champs de cotation
+    sont mis à jour en place. Chaque lot appliqué incrémente `version` et chaque symbole
+    retient la version de son dernier changement: un consommateur ne traite que les
+    symboles modifiés depuis la version qu'il a vue (changed_since).
+    """
+
+    STATIC_FIELDS = ('nom_complet', 'secteur', 'poids_gafam', 'fondation', 'fondateurs')
+    SILENT_FIELDS = ('timestamp',)  # Mis à jour sans constituer un changement
+    COLUMNS = ['symbole', 'nom_complet', 'secteur', 'prix_actuel', 'variation_pct', 'variation_abs',
+               'volume', 'timestamp', 'poids_gafam', 'fondation', 'fondateurs', 'dernier_prix',
+               'ouverture', 'prix_change']
+
+    def __init__(self, entreprises):
+        self.static = {symbole: {field: info[field] for field in self.STATIC_FIELDS}
+                       for symbole, info in entreprises.items()}
+        self.quotes = {}
+        self.version = 0
+        self.changed_at = {}        # symbole -> version du dernier changement
+        self.price_changed_at = {}  # symbole -> version du dernier changement de prix
+        self.changed_fields = {}    # symbole -> champs modifiés lors de ce changement
+        self._rows = {}  # symbole -> ligne du DataFrame (hors prix_change)
+        self._frame = pd.DataFrame(columns=self.COLUMNS)
+        self._frame_version = 0
+
+    def apply(self, updates):
+        """Applique un lot {symbole: {champ: valeur}} et retourne les symboles modifiés"""
+        version = self.version + 1
+        changed = set()
+
+        for symbole, fields in updates.items():
+            if symbole not in self.static:
+                continue
+
+            quote = self.quotes.setdefault(symbole, {})
+            modified = {field for field, value in fields.items()
+                        if field not in self.SILENT_FIELDS and quote.get(field) != value}
+
+            if 'prix_actuel' in modified:
+                if 'prix_actuel' in quote:
+                    self.price_changed_at[symbole] = version
+                quote['dernier_prix'] = quote.get('prix_actuel', fields['prix_actuel'])
+            quote.update(fields)
+
+            if modified:
+                self.changed_at[symbole] = version
+                self.changed_fields[symbole] = modified
+                changed.add(symbole)
+
+        if changed:
+            self.version = version
+        return changed
+
+    def changed_since(self, version):
+        """Symboles modifiés après la version donnée"""
+        return {symbole for symbole, v in self.changed_at.items() if v > version}
+
+    def price(self, symbole, default=None):
+        quote = self.quotes.get(symbole)
+        return quote['prix_actuel'] if quote else default
+
+    def _row(self, symbole):
+        row = {'symbole': symbole, **self.static[symbole], **self.quotes[symbole]}
+        return [row.get(column) for column in self.COLUMNS[:-1]]
+
+    def to_frame(self):
+        """DataFrame des données courantes, reconstruit une seule fois par version.
+
+        Seules les lignes des symboles modifiés sont recalculées; le DataFrame est ensuite
+        construit d'un bloc, bien moins coûteux que des affectations .loc ligne par ligne.
+        """
+        if self._frame_version == self.version:
+            return self._frame
+
+        for symbole in self.changed_since(self._frame_version):
+            self._rows[symbole] = self._row(symbole)
+
+        symboles = list(self._rows.keys())
+        self._frame = pd.DataFrame(list(self._rows.values()), columns=self.COLUMNS[:-1], index=symboles)
+        # Le drapeau prix_change n'est valable que pour la dernière version
+        self._frame['prix_change'] = [self.price_changed_at.get(s) == self.version for s in symboles]
+
+        self._frame_version = self.version
+        return self._frame
+
+
+class MarketCalendar:
+    """Calendrier de cotation NYSE/NASDAQ: horaires, week-ends, jours fériés et séances écourtées"""
+
+    TZ = ZoneInfo('America/New_York')
+    OPEN = dtime(9, 30)
+    CLOSE = dtime(16, 0)
+    EARLY_CLOSE = dtime(13, 0)
+    HOLIDAYS = {
+        date(2025, 1, 1), date(2025, 1, 9), date(2025, 1, 20), date(2025, 2, 17), date(2025, 4, 18),
+        date(2025, 5, 26), date(2025, 6, 19), date(2025, 7, 4), date(2025, 9, 1), date(2025, 11, 27),
+        date(2025, 12, 25),
+        date(2026, 1, 1), date(2026, 1, 19), date(2026, 2, 16), date(2026, 4, 3), date(2026, 5, 25),
+        date(2026, 6, 19), date(2026, 7, 3), date(2026, 9, 7), date(2026, 11, 26), date(2026, 12, 25),
+        date(2027, 1, 1), date(2027, 1, 18), date(2027, 2, 15), date(2027, 3, 26), date(2027, 5, 31),
+        date(2027, 6, 18), date(2027, 7, 5), date(2027, 9, 6), date(2027, 11, 25), date(2027, 12, 24)
+    }
+    EARLY_CLOSES = {
+        date(2025, 7, 3), date(2025, 11, 28), date(2025, 12, 24),
+        date(2026, 11, 27), date(2026, 12, 24),
+        date(2027, 11, 26)
+    }
+    # Dernière année couverte par les tables ci-dessus
+    LAST_YEAR = 2027
+
+    def now(self):
+        return datetime.now(self.TZ)
+
+    def session(self, day):
+        """Bornes (ouverture, clôture) de la séance du jour, ou None si le marché est fermé"""
+        if day.weekday() >= 5 or day in self.HOLIDAYS:
+            return None
+        close = self.EARLY_CLOSE if day in self.EARLY_CLOSES else self.CLOSE
+        return (datetime.combine(day, self.OPEN, self.TZ), datetime.combine(day, close, self.TZ))
+
+    def covers(self, now=None):
+        """Vrai si les jours fériés de l'année en cours figurent dans les tables"""
+        return (now or self.now()).astimezone(self.TZ).year <= self.LAST_YEAR
+
+    def is_open(self, now=None):
+        now = (now or self.now()).astimezone(self.TZ)
+        session = self.session(now.date())
+        return session is not None and session[0] <= now < session[1]
+
+    def seconds_until_open(self, now=None):
+        """Secondes avant la prochaine ouverture (0 si le marché est ouvert)"""
+        now = (now or self.now()).astimezone(self.TZ)
+        for offset in range(15):
+            session = self.session(now.date() + timedelta(days=offset))
+            if session is None or now >= session[1]:
+                continue
+            return max(0.0, (session[0] - now).total_seconds())
+        return 0.0
+
+
+class AdaptiveRefreshScheduler:
+    """Planifie les requêtes par symbole selon les horaires de marché et l'activité de chacun.
+
+    L'activité d'un symbole est une moyenne mobile exponentielle de la variation absolue
+    entre deux requêtes. Les symboles plus agités que la moyenne sont interrogés plus souvent,
+    les plus calmes moins souvent, et tous les intervalles sont allongés si la somme des
+    fréquences dépasse le budget global de requêtes par minute. Le budget prime sur
+    max_interval: un intervalle peut donc dépasser max_interval quand le budget l'exige.
+
+    Le planificateur ne supprime que des requêtes API: l'attente du script entre deux
+    reruns reste bornée par base_interval pour que l'interface reste réactive.
+    """
+
+    def __init__(self, calendar, base_interval=10, min_interval=5, max_interval=300,
+                 budget_per_minute=60, alpha=0.3):
+        self.calendar = calendar
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget_per_minute = budget_per_minute
+        self.alpha = alpha
+        self.enabled = True
+        self.activity = {}   # symbole -> EWMA de |rendement| entre deux requêtes
+        self.last_price = {}
+        self.next_due = {}   # symbole -> time.time() de la prochaine requête
+        self.requests_made = 0
+
+    def configure(self, base_interval, budget_per_minute, enabled):
+        self.base_interval = base_interval
+        self.budget_per_minute = budget_per_minute
+        self.enabled = enabled
+
+    def intervals(self):
+        """Intervalle de rafraîchissement (secondes) de chaque symbole suivi.
+
+        Le budget est appliqué après la borne max_interval et peut la dépasser.
+        """
+        if not self.activity:
+            return {}
+
+        eps = 1e-5
+        reference = sum(self.activity.values()) / len(self.activity)
+        intervals = {
+            symbole: min(self.max_interval,
+                         max(self.min_interval, self.base_interval * (reference + eps) / (activity + eps)))
+            for symbole, activity in self.activity.items()
+        }
+
+        requests_per_minute = sum(60 / interval for interval in intervals.values())
+        if requests_per_minute > self.budget_per_minute:
+            scale = requests_per_minute / self.budget_per_minute
+            intervals = {symbole: interval * scale for symbole, interval in intervals.items()}
+        return intervals
+
+    def record(self, symbole, prix, now=None):
+        """Enregistre le résultat d'une requête et planifie la suivante"""
+        now = now or time.time()
+        if prix is None or not np.isfinite(prix):
+            # Prix manquant: on replanifie sans toucher à l'activité ni au prix de référence
+            self.requests_made += 1
+            self.next_due[symbole] = now + self.intervals().get(symbole, self.base_interval)
+            return
+        previous = self.last_price.get(symbole)
+        if previous and np.isfinite(previous):
+            rendement = abs(prix / previous - 1)
+            activity = self.activity.get(symbole)
+            self.activity[symbole] = rendement if activity is None else \
+                self.alpha * rendement + (1 - self.alpha) * activity
+        else:
+            self.activity.setdefault(symbole, 0.0)
+        self.last_price[symbole] = prix
+        self.requests_made += 1
+        self.next_due[symbole] = now + self.intervals().get(symbole, self.base_interval)
+
+    def is_due(self, symbole, now=None):
+        if not self.enabled:
+            return True
+        if not self.calendar.is_open():
+            return symbole not in self.last_price
+        return self.next_due.get(symbole, 0) <= (now or time.time())
+
+    def due_symbols(self, symboles, now=None):
+        now = now or time.time()
+        return [symbole for symbole in symboles if self.is_due(symbole, now)]
+
+    def sleep_seconds(self, symboles, now=None):
+        """Attente avant le prochain rerun, jamais plus longue que base_interval"""
+        if not self.enabled or not self.calendar.is_open():
+            # Marché fermé: le rerun continue, seules les requêtes sont supprimées
+            return self.base_interval
+        now = now or time.time()
+        next_due = min((self.next_due.get(symbole, now) for symbole in symboles), default=now)
+        return min(self.base_interval, max(1.0, next_due - now))
+
+
+class StreamingAnomalyDetector:
+    """Détecte en flux les pics de rendement et de volume par z-score, en O(1) par symbole.
+
+    Pour chaque symbole on maintient, sur les rendements logarithmiques et sur les volumes,
+    une moyenne/variance cumulée (algorithme de Welford) et une moyenne/variance exponentielle
+    (EWMA). Chaque nouvelle barre est comparée aux statistiques EWMA d'avant sa prise en compte;
+    les mises à jour sont vectorisées sur tous les symboles de la barre.
+    """
+
+    KINDS = ('Rendement', 'Volume')
+
+    def __init__(self, symboles, alpha=0.05, threshold=4.0, warmup=30, history=200):
+        self.symboles = list(symboles)
+        self.index = {symbole: k for k, symbole in enumerate(self.symboles)}
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+
+        n = len(self.symboles)
+        self.last_price = np.full(n, np.nan)
+        self.count = np.zeros(n, dtype=int)
+        # Ligne 0: rendements, ligne 1: volumes
+        self.mean = np.zeros((2, n))
+        self.m2 = np.zeros((2, n))
+        self.ew_mean = np.zeros((2, n))
+        self.ew_var = np.zeros((2, n))
+        self.z = np.zeros((2, n))
+        self.anomalies = deque(maxlen=history)
+
+    def update(self, bars, timestamp=None):
+        """Intègre une barre {symbole: (prix, volume)} et retourne les anomalies détectées"""
+        symboles = [symbole for symbole in bars if symbole in self.index]
+        if not symboles:
+            return []
+
+        idx = np.array([self.index[symbole] for symbole in symboles])
+        prix = np.array([bars[symbole][0] for symbole in symboles], dtype=float)
+        volume = np.array([bars[symbole][1] for symbole in symboles], dtype=float)
+
+        # La première barre d'un symbole ne sert que de prix de référence
+        reference = self.last_price[idx]
+        self.last_price[idx] = prix
+        has_ref = ~np.isnan(reference) & (reference > 0) & (prix > 0)
+        if not has_ref.any():
+            return []
+        idx = idx[has_ref]
+        x = np.vstack([np.log(prix[has_ref] / reference[has_ref]), volume[has_ref]])
+
+        # z-score par rapport aux statistiques EWMA d'avant cette barre
+        std = np.sqrt(self.ew_var[:, idx])
+        z = np.divide(x - self.ew_mean[:, idx], std, out=np.zeros_like(x), where=std > 0)
+
+        # Welford: moyenne et variance cumulées
+        count = self.count[idx] + 1
+        delta = x - self.mean[:, idx]
+        self.mean[:, idx] += delta / count
+        self.m2[:, idx] += delta * (x - self.mean[:, idx])
+        self.count[idx] = count
+
+        # EWMA: initialisée sur la première observation
+        first = count == 1
+        diff = x - self.ew_mean[:, idx]
+        increment = self.alpha * diff
+        self.ew_mean[:, idx] = np.where(first, x, self.ew_mean[:, idx] + increment)
+        self.ew_var[:, idx] = np.where(first, 0.0, (1 - self.alpha) * (self.ew_var[:, idx] + diff * increment))
+        self.z[:, idx] = z
+
+        # Signaler les valeurs aberrantes une fois la période de chauffe passée
+        timestamp = timestamp or datetime.now()
+        detected = []
+        flagged = (np.abs(z) > self.threshold) & (count > self.warmup)
+        for kind, j in zip(*np.nonzero(flagged)):
+            k = idx[j]
+            detected.append({
+                'heure': timestamp,
+                'symbole': self.symboles[k],
+                'type': self.KINDS[kind],
+                'valeur': float(x[kind, j] * 100 if kind == 0 else x[kind, j]),
+                'z_score': float(z[kind, j]),
+                'z_cumule': float((x[kind, j] - self.mean[kind, k]) / np.sqrt(self.m2[kind, k] / (count[j] - 1)))
+                            if self.m2[kind, k] > 0 else 0.0
+            })
+        self.anomalies.extend(detected)
+        return detected
+
+    def scores(self):
+        """Derniers z-scores (EWMA) et statistiques cumulées de chaque symbole"""
+        n = np.maximum(self.count - 1, 1)
+        return pd.DataFrame({
+            'barres': self.count,
+            'z_rendement': self.z[0],
+            'z_volume': self.z[1],
+            'vol_rendement_pct': np.sqrt(self.m2[0] / n) * 100,
+            'volume_moyen': self.mean[1]
+        }, index=self.symboles)
+
+
+class MarketHierarchy:
+    """Agrégats Marché → secteur → sous-secteur → symbole maintenus de façon incrémentale.
+
+    Chaque nœud conserve la capitalisation, le volume et la somme des variations pondérées par
+    la capitalisation de ses descendants. Une cotation modifiée ne propage que son écart à ses
+    ancêtres (O(profondeur)), sans regroupement sur tout l'univers; rebuild() recalcule les
+    nœuds internes depuis les feuilles pour éliminer la dérive d'arrondi.
+    """
+
+    ROOT = 'Marché'
+    REBUILD_EVERY = 10000
+
+    def __init__(self, entreprises):
+        self.ids = [self.ROOT]
+        self.labels = [self.ROOT]
+        self.parents = ['']
+        self.depth = [0]
+        node = {self.ROOT: 0}
+        chains = {}
+
+        for symbole, info in entreprises.items():
+            secteur = info['secteur']
+            sous_secteur = f"{secteur}|{info['sous_secteur']}"
+            chain = [0]
+            for node_id, label, parent in ((secteur, secteur, self.ROOT),
+                                           (sous_secteur, info['sous_secteur'], secteur),
+                                           (f"{sous_secteur}|{symbole}", symbole, sous_secteur)):
+                if node_id not in node:
+                    node[node_id] = len(self.ids)
+                    self.ids.append(node_id)
+                    self.labels.append(label)
+                    self.parents.append(parent)
+                    self.depth.append(len(chain))
+                chain.append(node[node_id])
+            chains[symbole] = chain
+
+        self.symboles = list(chains.keys())
+        self.chains = {symbole: np.array(chain) for symbole, chain in chains.items()}
+        self.ancestors = np.array([chains[symbole] for symbole in self.symboles]).reshape(-1, 4)
+        self.depth = np.array(self.depth)
+
+        n = len(self.ids)
+        self.cap = np.zeros(n)
+        self.volume = np.zeros(n)
+        self.weighted = np.zeros(n)  # Somme des capitalisation × variation %
+        self.updates = 0
+
+    def update(self, symbole, capitalisation, variation_pct, volume):
+        """Remplace la contribution d'un symbole et propage l'écart à ses ancêtres"""
+        chain = self.chains.get(symbole)
+        if chain is None:
+            return
+        leaf = chain[-1]
+        self.weighted[chain] += capitalisation * variation_pct - self.weighted[leaf]
+        self.cap[chain] += capitalisation - self.cap[leaf]
+        self.volume[chain] += volume - self.volume[leaf]
+
+        self.updates += 1
+        if self.updates % self.REBUILD_EVERY == 0:
+            self.rebuild()
+
+    def rebuild(self):
+        """Recalcule les nœuds internes à partir des feuilles"""
+        leaves = self.ancestors[:, 3]
+        for values in (self.cap, self.volume, self.weighted):
+            values[self.depth < 3] = 0.0
+            for level in range(3):
+                np.add.at(values, self.ancestors[:, level], values[leaves])
+
+    def variation(self):
+        """Variation % pondérée par la capitalisation de chaque nœud"""
+        return np.divide(self.weighted, self.cap, out=np.zeros_like(self.cap), where=self.cap > 0)
+
+    def level(self, depth):
+        """Agrégats des nœuds d'un niveau (1: secteurs, 2: sous-secteurs, 3: symboles)"""
+        mask = self.depth == depth
+        return pd.DataFrame({
+            'nom': np.array(self.labels)[mask],
+            'capitalisation': self.cap[mask],
+            'volume': self.volume[mask],
+            'variation_pct': self.variation()[mask]
+        })
+
+
+DEMO_SECTEURS = {
+    'Technologie': ['Logiciels', 'Semi-conducteurs', 'Matériel'],
+    'Santé': ['Pharmacie', 'Biotechnologie', 'Équipements médicaux'],
+    'Finance': ['Banques', 'Assurance', "Gestion d'actifs"],
+    'Consommation': ['Distribution', 'Automobile', 'Loisirs'],
+    'Industrie': ['Aéronautique', 'Transport', 'Machines'],
+    'Énergie': ['Pétrole & Gaz', 'Renouvelables'],
+    'Communication': ['Médias', 'Télécoms', 'Divertissement']
+}
+
+REPLAY_SPEEDS = {'10x': 10, '100x': 100, '1000x': 1000, 'Maximum': None}
+
+
+class MarketReplay:
+    """Rejoue une séance enregistrée à travers le pipeline du dashboard.
+
+    Chaque barre est éclatée en quatre ticks (O, L, H, C pour une barre haussière, O, H, L, C
+    sinon) répartis sur sa durée et livrés selon une horloge accélérée. Les ticks sont regroupés
+    par symbole comme le fait StreamingFeedConsumer, puis chaque lot traverse le pipeline réel
+    sur une copie du dashboard: apply_stream_events, indicateurs en lot, bandeau, tableau et
+    carte thermique. Un tick remplacé avant d'avoir été traité compte comme mise à jour
+    abandonnée. En vitesse maximale, les ticks sont traités un par un.
+    """
+
+    STAGES = ('etat', 'indicateurs', 'tableau', 'figures')
+
+    def __init__(self, dashboard):
+        self.dashboard = dashboard
+
+    def session_days(self):
+        """Jours de cotation disponibles dans les données historiques"""
+        days = set()
+        for hist in self.dashboard.historical_data.values():
+            if not hist.empty:
+                days.update(hist.index.date)
+        return sorted(days)
+
+    def build_ticks(self, day):
+        """Ticks (ts, symbole, prix, volume) de la séance, triés par horodatage"""
+        ticks = []
+        for symbole, hist in self.dashboard.historical_data.items():
+            if hist.empty or symbole not in self.dashboard.entreprises:
+                continue
+            bars = hist[hist.index.date == day]
+            if len(bars) > 1:
+                bar_seconds = bars.index.to_series().diff().median().total_seconds()
+            else:
+                bar_seconds = 300.0
+            
+            for ts, bar in bars.iterrows():
+                if bar['Close'] >= bar['Open']:
+                    path = (bar['Open'], bar['Low'], bar['High'], bar['Close'])
+                else:
+                    path = (bar['Open'], bar['High'], bar['Low'], bar['Close'])
+                for k, prix in enumerate(path):
+                    ticks.append((ts.timestamp() + k * bar_seconds / 4, symbole, float(prix), float(bar['Volume']) / 4))
+        
+        ticks.sort(key=lambda tick: tick[0])
+        return ticks
+
+    def prepare_sandbox(self, ticks):
+        """Copie du dashboard amorcée aux prix d'ouverture; les capitalisations sont chargées hors mesure"""
+        sandbox = self.dashboard.create_replay_sandbox()
+        ouvertures = {}
+        for ts, symbole, prix, _ in ticks:
+            ouvertures.setdefault(symbole, (ts, prix))
+        
+        sandbox.live_state.apply({
+            symbole: {'prix_actuel': prix, 'variation_pct': 0.0, 'variation_abs': 0.0, 'volume': 0.0,
+                      'timestamp': datetime.fromtimestamp(ts), 'ouverture': prix}
+            for symbole, (ts, prix) in ouvertures.items()
+        })
+        for symbole in ouvertures:
+            sandbox.get_market_cap(symbole)
+        sandbox.refresh_hierarchy()
+        return sandbox
+
+    def process_batch(self, sandbox, batch, buffers):
+        """Une itération du pipeline du dashboard; retourne la durée (s) de chaque étape"""
+        durations = {}
+        t0 = time.perf_counter()
+        sandbox.apply_stream_events(batch)
+        t1 = time.perf_counter()
+        
+        for symbole, event in batch.items():
+            buffers[symbole].append(event['prix'])
+        sandbox.calculate_indicators_batch({symbole: buffers[symbole] for symbole in batch})
+        t2 = time.perf_counter()
+        
+        sandbox.build_ticker_content()
+        sandbox.prepare_table_data('Variation %', 'Tous')
+        t3 = time.perf_counter()
+        
+        sandbox.refresh_hierarchy()
+        sandbox.create_hierarchy_treemap(sandbox.hierarchy)
+        t4 = time.perf_counter()
+        
+        return dict(zip(self.STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)))
+
+    def run(self, day, speedup, max_duration=30):
+        """Rejoue la séance à la vitesse donnée (None = maximum) et retourne les statistiques"""
+        ticks = self.build_ticks(day)
+        if not ticks:
+            return None
+        
+        sandbox = self.prepare_sandbox(ticks)
+        buffers = {symbole: deque(maxlen=200) for symbole in self.dashboard.entreprises}
+        pending = {}   # symbole -> événement au format de StreamingFeedConsumer.drain()
+        arrivals = {}  # symbole -> arrivée (horloge murale) du plus ancien tick en attente
+        latences = []
+        stage_totals = dict.fromkeys(self.STAGES, 0.0)
+        dropped = 0
+        batches = 0
+        i = 0
+        
+        t0 = ticks[0][0]
+        start = time.perf_counter()
+        arrival_of = lambda tick: start + (tick[0] - t0) / speedup
+        
+        def ingest(tick, arrival):
+            nonlocal dropped
+            ts, symbole, prix, volume = tick
+            previous = pending.get(symbole)
+            if previous:
+                dropped += 1
+            pending[symbole] = {
+                'prix': prix,
+                'volume': volume + (previous['volume'] if previous else 0),
+                'ts': ts,
+                'ts_premier': previous['ts_premier'] if previous else ts,
+                'nb_ticks': (previous['nb_ticks'] if previous else 0) + 1
+            }
+            arrivals.setdefault(symbole, arrival)
+        
+        while i < len(ticks) or pending:
+            now = time.perf_counter()
+            if now - start > max_duration:
+                break
+            
+            # Ingestion des ticks arrivés selon l'horloge accélérée
+            if speedup is None:
+                ingest(ticks[i], now)
+                i += 1
+            else:
+                while i < len(ticks) and arrival_of(ticks[i]) <= now:
+                    ingest(ticks[i], arrival_of(ticks[i]))
+                    i += 1
+            
+            if not pending:
+                time.sleep(max(0.0, arrival_of(ticks[i]) - time.perf_counter()))
+                continue
+            
+            batch, pending = pending, {}
+            batch_arrivals, arrivals = arrivals, {}
+            durations = self.process_batch(sandbox, batch, buffers)
+            done = time.perf_counter()
+            latences.extend((done - arrival) * 1000 for arrival in batch_arrivals.values())
+            for stage, duration in durations.items():
+                stage_totals[stage] += duration
+            batches += 1
+        
+        elapsed = time.perf_counter() - start
+        result = {
+            'vitesse': 'Maximum' if speedup is None else f"{speedup}x",
+            'ticks_recus': i,
+            'ticks_total': len(ticks),
+            # Débit offert (ticks ingérés) vs débit soutenu (mises à jour réellement appliquées)
+            'ticks_offerts_par_seconde': i / elapsed if elapsed > 0 else 0.0,
+            'mises_a_jour_par_seconde': len(latences) / elapsed if elapsed > 0 else 0.0,
+            'mises_a_jour': len(latences),
+            'abandonnees': dropped,
+            'lots': batches,
+            'latence_p50_ms': float(np.percentile(latences, 50)) if latences else 0.0,
+            'latence_p95_ms': float(np.percentile(latences, 95)) if latences else 0.0,
+            'latence_p99_ms': float(np.percentile(latences, 99)) if latences else 0.0,
+            'duree_s': elapsed,
+            'complet': i == len(ticks)
+        }
+        # Coût moyen de chaque étape par lot, pour localiser la saturation
+        for stage, total in stage_totals.items():
+            result[f'{stage}_ms_par_lot'] = total / batches * 1000 if batches else 0.0
+        return result
+
+
 class RealTimeGAFAMDashboard:
     def __init__(self):
         self.entreprises = self.define_entreprises()
         self.historical_data = {}
         self.last_update = datetime.now()
         self.update_frequency = 10  # secondes
-        self.real_time_prices = {}  # CORRECTION: Déplacé avant initialize_current_data() pour éviter l'AttributeError
+        self.scheduler = AdaptiveRefreshScheduler(MarketCalendar())
+        self.index_quotes = {}  # Dernières valeurs des indices, rafraîchies selon le planificateur
+        self.shares_outstanding = {}  # Nombre d'actions, pour estimer la capitalisation sans requête
+        self.ingestion_mode = 'Polling'
+        self.stream_consumer = None
+        self.test_feed = None  # Flux simulé local, uniquement sur demande explicite
+        self.replay_results = []
+        self.demo_hierarchy = None
+        self.demo_quotes = {}
         
-        # Initialiser les données historiques
+        # Initialiser les données historiques et leurs indicateurs (calcul en lot)
+        self.indicators = {}
         self.initialize_historical_data()
         
-        # Initialiser les données courantes après avoir initialisé real_time_prices
-        self.current_data = self.initialize_current_data()
+        # État live et consommateurs incrémentaux
+        self.reset_live_pipeline()
+        
+        # Initialiser les données courantes
+        self.initialize_current_data()
+    
+    def reset_live_pipeline(self):
+        """(Ré)initialise l'état live et tout ce qui en dérive de façon incrémentale"""
+        self.live_state = LiveMarketState(self.entreprises)
+        self.stream_stats = {'evenements': 0, 'ticks': 0, 'latence_ms': []}
+        # Le détecteur reçoit des barres d'une minute terminées, quel que soit le mode d'ingestion
+        self.anomaly_detector = StreamingAnomalyDetector(self.entreprises.keys())
+        self._last_bar_fed = {}  # Polling: début de la dernière barre transmise au détecteur
+        self._minute_bars = {}   # Streaming: barre d'une minute en cours par symbole
+        self.hierarchy = MarketHierarchy(self.entreprises)
+        self._hierarchy_version = 0
+        # Dernière version de l'état vue par le bandeau défilant
+        self._ticker_items = {}
+        self._ticker_version = 0
+    
+    def create_replay_sandbox(self):
+        """Copie du dashboard avec un pipeline live vierge, pour rejouer sans toucher l'état réel"""
+        sandbox = copy.copy(self)
+        sandbox.stream_consumer = None
+        sandbox.test_feed = None
+        sandbox.reset_live_pipeline()
+        return sandbox
+    
+    @property
+    def current_data(self):
+        """Vue DataFrame de l'état live, pour les composants qui travaillent sur un tableau"""
+        return self.live_state.to_frame()
         
     def define_entreprises(self):
         """Définit les entreprises du GAFAM avec leurs tickers"""
@@ -246,7 +1107,9 @@ class RealTimeGAFAMDashboard:
                     'volume': latest['Volume'],
                     'timestamp': datetime.now(),
                     'variation': latest['Close'] - data['Open'].iloc[0] if len(data) > 0 else 0,
-                    'variation_pct': ((latest['Close'] - data['Open'].iloc[0]) / data['Open'].iloc[0]) * 100 if len(data) > 0 else 0
+                    'variation_pct': ((latest['Close'] - data['Open'].iloc[0]) / data['Open'].iloc[0]) * 100 if len(data) > 0 else 0,
+                    # Barres d'une minute terminées (la dernière ligne est encore en formation)
+                    'barres_terminees': list(zip(data.index[:-1], data['Close'].iloc[:-1], data['Volume'].iloc[:-1]))
                 }
             else:
                 # Fallback: données quotidiennes
@@ -265,104 +1128,203 @@ class RealTimeGAFAMDashboard:
         
         return None
     
+    def quote_fields(self, real_time_data):
+        """Champs de cotation de l'état live à partir d'une réponse get_real_time_price"""
+        return {
+            'prix_actuel': real_time_data['prix'],
+            'variation_pct': real_time_data['variation_pct'],
+            'variation_abs': real_time_data['variation'],
+            'volume': real_time_data['volume'],
+            'timestamp': real_time_data['timestamp'],
+            'ouverture': real_time_data['prix'] - real_time_data['variation']
+        }
+    
     def initialize_current_data(self):
         """Initialise les données courantes en temps réel"""
-        current_data = []
-        
-        for ticker, info in self.entreprises.items():
-            real_time_data = self.get_real_time_price(ticker)
-            
-            if real_time_data:
-                current_data.append({
-                    'symbole': ticker,
-                    'nom_complet': info['nom_complet'],
-                    'secteur': info['secteur'],
-                    'prix_actuel': real_time_data['prix'],
-                    'variation_pct': real_time_data['variation_pct'],
-                    'variation_abs': real_time_data['variation'],
-                    'volume': real_time_data['volume'],
-                    'timestamp': real_time_data['timestamp'],
-                    'poids_gafam': info['poids_gafam'],
-                    'fondation': info['fondation'],
-                    'fondateurs': info['fondateurs'],
-                    'dernier_prix': real_time_data['prix']  # Pour comparaison
-                })
-                
-                # Stocker le prix pour le ticker tape
-                self.real_time_prices[ticker] = real_time_data['prix']
-        
-        return pd.DataFrame(current_data)
+        self.update_live_data()
     
     def initialize_historical_data(self):
-        """Initialise les données historiques pour chaque entreprise"""
+        """Initialise (ou rafraîchit) les données historiques pour chaque entreprise"""
+        changed = False
         for ticker in self.entreprises.keys():
             try:
-                stock = yf.Ticker(ticker)
-                # Récupérer les données des 7 derniers jours avec un intervalle de 5 minutes
-                hist = stock.history(period='7d', interval='5m')
-                self.historical_data[ticker] = hist
+                # Données des 7 derniers jours en 5 minutes, refetchées au plus une fois par barre
+                hist = fetch_historical_data(ticker)
+                previous = self.historical_data.get(ticker)
+                if previous is None or not hist.index.equals(previous.index) or not hist['Close'].equals(previous['Close']):
+                    self.historical_data[ticker] = hist
+                    changed = True
             except Exception as e:
                 st.error(f"Erreur historique {ticker}: {e}")
+        
+        # Les indicateurs ne sont recalculés que si l'historique a changé
+        if changed or not self.indicators:
+            self.indicators = self.calculate_indicators_batch(
+                {ticker: hist['Close'] for ticker, hist in self.historical_data.items() if not hist.empty}
+            )
     
-    def update_live_data(self):
-        """Met à jour les données en temps réel"""
+    def update_live_data(self, symbols=None):
+        """Met à jour les données en temps réel (tous les symboles, ou seulement ceux indiqués)"""
         try:
-            new_data = []
+            updates = {}
+            completed_bars = {}  # début de barre -> {symbole: (prix, volume)}
             
-            for ticker, info in self.entreprises.items():
+            for ticker in (self.entreprises.keys() if symbols is None else symbols):
                 real_time_data = self.get_real_time_price(ticker)
                 
                 if real_time_data:
-                    # Vérifier si le prix a changé pour l'animation
-                    old_price = self.real_time_prices.get(ticker, 0)
-                    new_price = real_time_data['prix']
-                    
-                    new_data.append({
-                        'symbole': ticker,
-                        'nom_complet': info['nom_complet'],
-                        'secteur': info['secteur'],
-                        'prix_actuel': new_price,
-                        'variation_pct': real_time_data['variation_pct'],
-                        'variation_abs': real_time_data['variation'],
-                        'volume': real_time_data['volume'],
-                        'timestamp': real_time_data['timestamp'],
-                        'poids_gafam': info['poids_gafam'],
-                        'fondation': info['fondation'],
-                        'fondateurs': info['fondateurs'],
-                        'dernier_prix': old_price,
-                        'prix_change': new_price != old_price
-                    })
+                    updates[ticker] = self.quote_fields(real_time_data)
+                    self.scheduler.record(ticker, real_time_data['prix'])
                     
-                    # Mettre à jour le prix réel
-                    self.real_time_prices[ticker] = new_price
+                    # Toutes les barres terminées depuis le dernier polling, chacune transmise une seule fois
+                    last_fed = self._last_bar_fed.get(ticker)
+                    for debut, close, volume in real_time_data.get('barres_terminees', ()):
+                        if last_fed is None or debut > last_fed:
+                            completed_bars.setdefault(debut, {})[ticker] = (close, volume)
+                            self._last_bar_fed[ticker] = debut
             
-            if new_data:
-                self.current_data = pd.DataFrame(new_data)
+            if updates:
+                self.live_state.apply(updates)
+                # Une mise à jour par minute, dans l'ordre, pour que chaque rendement porte sur une seule barre
+                for debut in sorted(completed_bars):
+                    self.anomaly_detector.update(completed_bars[debut], debut)
                 self.last_update = datetime.now()
                 
         except Exception as e:
             st.error(f"Erreur mise à jour temps réel: {e}")
     
-    def display_ticker_tape(self):
-        """Affiche le bandeau défilant avec les prix en temps réel"""
-        if self.current_data.empty:
+    def apply_stream_events(self, events):
+        """Applique un lot d'événements poussés (un par symbole) aux données courantes"""
+        if not events:
             return
+        
+        now = time.time()
+        updates = {}
+        latences = []
+        
+        for ticker, event in events.items():
+            quote = self.live_state.quotes.get(ticker)
+            if quote is None:
+                continue
             
-        ticker_items = []
-        for _, row in self.current_data.iterrows():
-            change_class = "positive" if row['variation_pct'] > 0 else "negative" if row['variation_pct'] < 0 else "neutral"
-            arrow = "▲" if row['variation_pct'] > 0 else "▼" if row['variation_pct'] < 0 else "●"
+            new_price = event['prix']
+            ouverture = quote['ouverture'] or new_price
             
-            ticker_items.append(
-                f"{row['symbole']}: ${row['prix_actuel']:.2f} {arrow} {row['variation_pct']:+.2f}%"
+            updates[ticker] = {
+                'prix_actuel': new_price,
+                'variation_abs': new_price - ouverture,
+                'variation_pct': (new_price - ouverture) / ouverture * 100,
+                'volume': quote['volume'] + event['volume'],
+                'timestamp': datetime.fromtimestamp(event['ts'])
+            }
+            
+            self.stream_stats['ticks'] += event['nb_ticks']
+            latences.append((now - event['ts_premier']) * 1000)
+        
+        self.live_state.apply(updates)
+        self.anomaly_detector.update(self.close_minute_bars(
+            {ticker: (events[ticker]['ts'], events[ticker]['prix'], events[ticker]['volume']) for ticker in updates}
+        ))
+        self.last_update = datetime.now()
+        self.stream_stats['evenements'] += len(events)
+        self.stream_stats['latence_ms'] = latences
+    
+    def stop_test_feed(self):
+        """Arrête le flux de test local et le consommateur qui y est connecté"""
+        if self.test_feed is not None:
+            if self.stream_consumer is not None and self.stream_consumer.url == self.test_feed.url:
+                self.stop_stream_consumer()
+            self.test_feed.stop()
+            self.test_feed = None
+    
+    def stop_stream_consumer(self):
+        """Arrête le consommateur du flux en cours (changement d'URL ou retour au polling)"""
+        if self.stream_consumer is not None:
+            self.stream_consumer.stop()
+            self.stream_consumer = None
+            # Une barre en cours ne doit pas être close avec le volume d'une autre session de flux
+            self._minute_bars = {}
+    
+    def close_minute_bars(self, ticks):
+        """Agrège des ticks {symbole: (ts, prix, volume)} en barres d'une minute; retourne les barres terminées.
+
+        Un lot regroupé est rattaché à la minute de son dernier tick.
+        """
+        completed = {}
+        for symbole, (ts, prix, volume) in ticks.items():
+            minute = int(ts // 60)
+            bar = self._minute_bars.get(symbole)
+            if bar is not None and bar[0] != minute:
+                completed[symbole] = (bar[1], bar[2])
+                bar = None
+            if bar is None:
+                bar = self._minute_bars[symbole] = [minute, prix, 0.0]
+            bar[1] = prix
+            bar[2] += volume
+        return completed
+    
+    def create_streaming_controls(self):
+        """Contrôles du mode streaming: source du flux et flux de test local"""
+        interval = st.sidebar.slider("Intervalle d'affichage (secondes)", 
+                                    min_value=0.5, max_value=5.0, value=1.0, step=0.5)
+        feed_url = st.sidebar.text_input("Source du flux (ws://… ou tcp://hôte:port)", value="",
+                                        placeholder="ws://fournisseur/flux")
+        
+        # Flux simulé: uniquement sur demande, il remplace alors la source saisie
+        if st.sidebar.checkbox("🧪 Utiliser le flux de test local (prix simulés)", value=False):
+            if self.test_feed is None:
+                self.test_feed = LocalTestFeed({s: q['prix_actuel'] for s, q in self.live_state.quotes.items()})
+            if self.test_feed.error:
+                st.sidebar.warning(self.test_feed.error)
+            feed_url = self.test_feed.url
+        else:
+            self.stop_test_feed()
+        
+        if not feed_url:
+            self.stop_stream_consumer()
+            st.sidebar.info("📡 Saisir l'adresse d'un flux pour démarrer le streaming")
+            return interval
+        
+        # Un seul consommateur par session: l'ancien est arrêté quand l'URL change
+        if self.stream_consumer is None or self.stream_consumer.url != feed_url:
+            self.stop_stream_consumer()
+            self.stream_consumer = StreamingFeedConsumer(feed_url)
+        
+        if self.stream_consumer.connected:
+            st.sidebar.success(f"📡 Connecté • {self.stream_consumer.events_received:,} ticks reçus")
+            if self.stream_consumer.last_error:
+                st.sidebar.caption(f"⚠️ {self.stream_consumer.last_error}")
+        else:
+            st.sidebar.warning(f"📡 Connexion au flux... {self.stream_consumer.last_error or ''}")
+        
+        return interval
+    
+    def build_ticker_content(self):
+        """Contenu du bandeau défilant"""
+        # Ne reformater que les symboles modifiés depuis le dernier affichage
+        for symbole in self.live_state.changed_since(self._ticker_version):
+            quote = self.live_state.quotes[symbole]
+            arrow = "▲" if quote['variation_pct'] > 0 else "▼" if quote['variation_pct'] < 0 else "●"
+            
+            self._ticker_items[symbole] = (
+                f"{symbole}: ${quote['prix_actuel']:.2f} {arrow} {quote['variation_pct']:+.2f}%"
             )
+        self._ticker_version = self.live_state.version
         
-        ticker_content = " • ".join(ticker_items)
+        return " • ".join(self._ticker_items.values())
+    
+    def display_ticker_tape(self):
+        """Affiche le bandeau défilant avec les prix en temps réel"""
+        if self.current_data.empty:
+            return
+        
+        ticker_content = self.build_ticker_content()
+        badge = "🧪 SIMULÉ" if self.test_feed is not None else "🔴 LIVE"
         
         st.markdown(f"""
         <div class="ticker-tape">
             <div class="ticker-content">
-                <strong>🔴 LIVE • {ticker_content} • </strong>
+                <strong>{badge} • {ticker_content} • </strong>
             </div>
         </div>
         """, unsafe_allow_html=True)
@@ -377,8 +1339,12 @@ class RealTimeGAFAMDashboard:
         
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            st.markdown('<div class="live-badge">🔴 DONNÉES LIVE • MISE À JOUR AUTOMATIQUE</div>', 
-                       unsafe_allow_html=True)
+            if self.test_feed is not None:
+                st.markdown('<div class="live-badge">🧪 DONNÉES SIMULÉES • FLUX DE TEST LOCAL</div>', 
+                           unsafe_allow_html=True)
+            else:
+                st.markdown('<div class="live-badge">🔴 DONNÉES LIVE • MISE À JOUR AUTOMATIQUE</div>', 
+                           unsafe_allow_html=True)
             st.markdown("**Surveillance en temps réel des géants technologiques**")
         
         current_time = datetime.now().strftime('%H:%M:%S')
@@ -433,27 +1399,45 @@ class RealTimeGAFAMDashboard:
                 "LIVE"
             )
     
+    def get_index_quote(self, indice_ticker):
+        """Récupère (valeur, variation %) d'un indice, en cache tant que le planificateur ne le demande pas"""
+        if self.scheduler.is_due(indice_ticker) or indice_ticker not in self.index_quotes:
+            try:
+                hist = yf.Ticker(indice_ticker).history(period='1d', interval='1m')
+                if not hist.empty:
+                    valeur = hist['Close'].iloc[-1]
+                    ouverture = hist['Open'].iloc[0]
+                    self.index_quotes[indice_ticker] = (valeur, ((valeur - ouverture) / ouverture) * 100)
+                    self.scheduler.record(indice_ticker, valeur)
+            except:
+                pass
+        return self.index_quotes.get(indice_ticker)
+    
     def get_nasdaq_value(self):
         """Récupère la valeur actuelle du NASDAQ"""
-        try:
-            nasdaq = yf.Ticker("^IXIC")
-            hist = nasdaq.history(period='1d', interval='1m')
-            if not hist.empty:
-                return hist['Close'].iloc[-1]
-        except:
-            pass
+        quote = self.get_index_quote("^IXIC")
+        if quote:
+            return quote[0]
         return 15000  # Valeur par défaut
     
     def get_market_cap(self, symbol):
         """Estime la capitalisation boursière"""
-        try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            return info.get('marketCap', self.current_data[self.current_data['symbole'] == symbol]['prix_actuel'].iloc[0] * 1e9)
-        except:
-            if not self.current_data.empty:
-                return self.current_data[self.current_data['symbole'] == symbol]['prix_actuel'].iloc[0] * 1e9
+        prix = self.live_state.price(symbol)
+        
+        # Le nombre d'actions ne bouge pas en séance: une seule requête 'info' par symbole
+        if symbol not in self.shares_outstanding:
+            try:
+                info = yf.Ticker(symbol).info
+                shares = info.get('sharesOutstanding')
+                if not shares and info.get('marketCap') and prix:
+                    shares = info['marketCap'] / prix
+                self.shares_outstanding[symbol] = shares or 1e9
+            except:
+                self.shares_outstanding[symbol] = 1e9
+        
+        if prix is None:
             return 1e9  # Valeur par défaut
+        return prix * self.shares_outstanding[symbol]
     
     def create_real_time_charts(self):
         """Crée les graphiques en temps réel"""
@@ -525,10 +1509,8 @@ class RealTimeGAFAMDashboard:
                 data = self.historical_data[selected_stock]
                 
                 if not data.empty:
-                    # Calcul des indicateurs techniques
-                    data['MA20'] = data['Close'].rolling(window=20).mean()
-                    data['MA50'] = data['Close'].rolling(window=50).mean()
-                    data['RSI'] = self.calculate_rsi(data['Close'])
+                    # Indicateurs techniques précalculés pour tout l'univers
+                    data = data.join(self.get_indicators(selected_stock, data.index))
                     
                     fig = make_subplots(
                         rows=3, cols=1,
@@ -571,6 +1553,108 @@ class RealTimeGAFAMDashboard:
         rsi = 100 - (100 / (1 + rs))
         return rsi
     
+    def build_price_matrix(self, closes_by_symbol):
+        """Matrice 2-D des prix (positions × symboles), alignée à droite et complétée par des NaN"""
+        length = max((len(values) for values in closes_by_symbol.values()), default=0)
+        matrix = np.full((length, len(closes_by_symbol)), np.nan)
+        for j, values in enumerate(closes_by_symbol.values()):
+            values = np.asarray(values, dtype=float)
+            if len(values):
+                matrix[length - len(values):, j] = values
+        return pd.DataFrame(matrix, columns=list(closes_by_symbol.keys()))
+    
+    def calculate_rsi_batch(self, closes, window=14):
+        """RSI de toutes les colonnes d'une matrice de prix, identique à calculate_rsi colonne par colonne"""
+        delta = closes.diff()
+        # Le remplissage par 0 de where() ne doit pas toucher le padding à gauche;
+        # les trous internes (NaN en cours d'historique) restent traités comme en série
+        valid = closes.notna().cummax()
+        gain = (delta.where(delta > 0, 0)).where(valid).rolling(window=window).mean()
+        loss = (-delta.where(delta < 0, 0)).where(valid).rolling(window=window).mean()
+        rs = gain / loss
+        rsi = 100 - (100 / (1 + rs))
+        return rsi
+    
+    def calculate_indicators_batch(self, closes_by_symbol):
+        """Calcule MM20, MM50, RSI et variation de tout l'univers en une passe vectorisée"""
+        closes = self.build_price_matrix(closes_by_symbol)
+        first = closes.bfill().iloc[0] if len(closes) else pd.Series(dtype=float)
+        last = closes.iloc[-1] if len(closes) else pd.Series(dtype=float)
+        return {
+            'MA20': closes.rolling(window=20).mean(),
+            'MA50': closes.rolling(window=50).mean(),
+            'RSI': self.calculate_rsi_batch(closes),
+            'variation_pct': (last - first) / first * 100
+        }
+    
+    def get_indicators(self, symbol, index):
+        """Extrait les indicateurs d'un symbole du calcul en lot, réindexés sur ses propres dates"""
+        n = len(index)
+        return pd.DataFrame({
+            column: self.indicators[column][symbol].to_numpy()[-n:] if symbol in self.indicators[column] else np.nan
+            for column in ('MA20', 'MA50', 'RSI')
+        }, index=index)
+    
+    def calculate_indicators_serial(self, closes_by_symbol):
+        """Chemin de référence: indicateurs calculés symbole par symbole"""
+        results = {}
+        for symbol, values in closes_by_symbol.items():
+            closes = pd.Series(np.asarray(values, dtype=float))
+            results[symbol] = {
+                'MA20': closes.rolling(window=20).mean(),
+                'MA50': closes.rolling(window=50).mean(),
+                'RSI': self.calculate_rsi(closes),
+                'variation_pct': (closes.iloc[-1] - closes.iloc[0]) / closes.iloc[0] * 100
+            }
+        return results
+    
+    def benchmark_indicators(self, n_symbols):
+        """Compare chemin série et calcul en lot sur un univers synthétique dérivé de l'historique"""
+        bases = [hist['Close'].to_numpy() for hist in self.historical_data.values() if not hist.empty]
+        if not bases:
+            return None
+        
+        rng = np.random.default_rng(42)
+        universe = {}
+        for k in range(n_symbols):
+            base = bases[k % len(bases)]
+            # Longueurs différentes pour exercer l'alignement de la matrice
+            length = min(len(base), max(60, len(base) - int(rng.integers(0, max(1, len(base) // 4)))))
+            values = base[-length:] * np.exp(np.cumsum(rng.normal(0, 0.001, length)))
+            # Un symbole sur dix a un trou de cotation en cours d'historique
+            if k % 10 == 0 and length > 2:
+                values[int(rng.integers(1, length - 1))] = np.nan
+            universe[f"SYN{k:04d}"] = values
+        
+        start = time.perf_counter()
+        serial = self.calculate_indicators_serial(universe)
+        serial_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        batch = self.calculate_indicators_batch(universe)
+        batch_time = time.perf_counter() - start
+        
+        max_ecart = 0.0
+        identique = True
+        for symbol, values in universe.items():
+            n = len(values)
+            for column in ('MA20', 'MA50', 'RSI'):
+                a = serial[symbol][column].to_numpy()
+                b = batch[column][symbol].to_numpy()[-n:]
+                identique &= bool(np.array_equal(a, b, equal_nan=True))
+                if np.isfinite(a).any():
+                    max_ecart = max(max_ecart, float(np.nanmax(np.abs(a - b))))
+            identique &= bool(serial[symbol]['variation_pct'] == batch['variation_pct'][symbol])
+        
+        return {
+            'symboles': n_symbols,
+            'serie_ms': serial_time * 1000,
+            'lot_ms': batch_time * 1000,
+            'acceleration': serial_time / batch_time if batch_time > 0 else float('inf'),
+            'identique': identique,
+            'ecart_max': max_ecart
+        }
+    
     def create_real_time_table(self):
         """Crée le tableau des prix en temps réel"""
         st.markdown('<h3 class="section-header">🏢 TABLEAU DES PRIX TEMPS RÉEL</h3>', 
@@ -591,29 +1675,11 @@ class RealTimeGAFAMDashboard:
         with col3:
             auto_refresh = st.checkbox("🔄 Auto-rafraîchissement", value=True)
         
-        # Appliquer les filtres
-        display_data = self.current_data.copy()
-        if filter_sector != 'Tous':
-            display_data = display_data[display_data['secteur'] == filter_sector]
-        
-        # Appliquer le tri
-        if sort_by == 'Variation %':
-            display_data = display_data.sort_values('variation_pct', ascending=False)
-        elif sort_by == 'Prix':
-            display_data = display_data.sort_values('prix_actuel', ascending=False)
-        elif sort_by == 'Volume':
-            display_data = display_data.sort_values('volume', ascending=False)
+        display_data = self.prepare_table_data(sort_by, filter_sector)
         
         # Afficher les données avec animations
         for _, row in display_data.iterrows():
-            # Déterminer la classe CSS pour la variation
-            change_class = ""
-            if row['variation_pct'] > 0:
-                change_class = "positive"
-            elif row['variation_pct'] < 0:
-                change_class = "negative"
-            else:
-                change_class = "neutral"
+            change_class = row['classe']
             
             # Vérifier si le prix a changé pour l'animation
             price_changed = row.get('prix_change', False)
@@ -627,8 +1693,7 @@ class RealTimeGAFAMDashboard:
             
             with col2:
                 st.markdown(f"**{row['nom_complet']}**")
-                market_cap = self.get_market_cap(row['symbole']) / 1e9
-                st.markdown(f"Market Cap: {market_cap:.1f} B$")
+                st.markdown(f"Market Cap: {row['capitalisation'] / 1e9:.1f} B$")
             
             with col3:
                 st.markdown(f"<div class='{flash_class}'>**${row['prix_actuel']:.2f}**</div>", 
@@ -646,21 +1711,42 @@ class RealTimeGAFAMDashboard:
             
             with col6:
                 # Indicateur de tendance
-                if row['variation_pct'] > 1:
-                    st.markdown("📈 Forte hausse")
-                elif row['variation_pct'] > 0:
-                    st.markdown("↗️ Légère hausse")
-                elif row['variation_pct'] < -1:
-                    st.markdown("📉 Forte baisse")
-                elif row['variation_pct'] < 0:
-                    st.markdown("↘️ Légère baisse")
-                else:
-                    st.markdown("➡️ Stable")
+                st.markdown(row['tendance'])
             
             st.markdown("---")
         
         return auto_refresh
     
+    def prepare_table_data(self, sort_by, filter_sector):
+        """Données du tableau live: filtre, tri et colonnes d'affichage"""
+        # Appliquer les filtres
+        display_data = self.current_data.copy()
+        if filter_sector != 'Tous':
+            display_data = display_data[display_data['secteur'] == filter_sector]
+        
+        display_data['capitalisation'] = [self.get_market_cap(symbole) for symbole in display_data['symbole']]
+        
+        # Classe CSS et indicateur de tendance selon la variation
+        variation = display_data['variation_pct']
+        display_data['classe'] = np.select([variation > 0, variation < 0], ['positive', 'negative'], 'neutral')
+        display_data['tendance'] = np.select(
+            [variation > 1, variation > 0, variation < -1, variation < 0],
+            ["📈 Forte hausse", "↗️ Légère hausse", "📉 Forte baisse", "↘️ Légère baisse"],
+            "➡️ Stable"
+        )
+        
+        # Appliquer le tri
+        if sort_by == 'Variation %':
+            display_data = display_data.sort_values('variation_pct', ascending=False)
+        elif sort_by == 'Prix':
+            display_data = display_data.sort_values('prix_actuel', ascending=False)
+        elif sort_by == 'Volume':
+            display_data = display_data.sort_values('volume', ascending=False)
+        elif sort_by == 'Capitalisation':
+            display_data = display_data.sort_values('capitalisation', ascending=False)
+        
+        return display_data
+    
     def create_market_overview(self):
         """Vue d'ensemble du marché en temps réel"""
         st.markdown('<h3 class="section-header">🌍 VUE MARCHÉ TEMPS RÉEL</h3>', 
@@ -670,29 +1756,26 @@ class RealTimeGAFAMDashboard:
             st.warning("Chargement des données en cours...")
             return
         
+        demo = st.checkbox("🧪 Univers de démonstration (test de montée en charge)")
+        if demo:
+            n_symbols = st.slider("Nombre de symboles", min_value=100, max_value=2000, value=500, step=100)
+            start = time.perf_counter()
+            hierarchy = self.refresh_demo_hierarchy(n_symbols)
+        else:
+            start = time.perf_counter()
+            self.refresh_hierarchy()
+            hierarchy = self.hierarchy
+        
         col1, col2 = st.columns(2)
         
         with col1:
-            # Carte thermique des performances
-            performance_data = self.current_data[['symbole', 'variation_pct']].copy()
-            performance_data['abs_variation'] = abs(performance_data['variation_pct'])
-            
-            fig = px.treemap(performance_data,
-                           path=['symbole'],
-                           values='abs_variation',
-                           color='variation_pct',
-                           color_continuous_scale='RdYlGn',
-                           title='Carte Thermique des Performances',
-                           hover_data=['variation_pct'])
+            # Carte thermique hiérarchique: cliquer sur un secteur pour descendre d'un niveau
+            fig = self.create_hierarchy_treemap(hierarchy)
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            # Graphique de répartition sectorielle
-            sector_data = self.current_data.groupby('secteur').agg({
-                'prix_actuel': 'count',
-                'variation_pct': 'mean',
-                'volume': 'sum'
-            }).reset_index()
+            # Graphique de répartition sectorielle, lu dans les agrégats précalculés
+            sector_data = hierarchy.level(1).rename(columns={'nom': 'secteur'})
             
             fig = px.pie(sector_data, 
                         values='volume', 
@@ -701,6 +1784,161 @@ class RealTimeGAFAMDashboard:
                         color='secteur',
                         color_discrete_sequence=px.colors.qualitative.Bold)
             st.plotly_chart(fig, use_container_width=True)
+        
+        st.caption(f"{len(hierarchy.symboles)} symboles • agrégats et figures préparés en "
+                   f"{(time.perf_counter() - start) * 1000:.0f} ms")
+    
+    def refresh_hierarchy(self):
+        """Propage dans la hiérarchie les seules cotations modifiées depuis le dernier affichage"""
+        for symbole in self.live_state.changed_since(self._hierarchy_version):
+            quote = self.live_state.quotes[symbole]
+            self.hierarchy.update(symbole, self.get_market_cap(symbole), quote['variation_pct'], quote['volume'])
+        self._hierarchy_version = self.live_state.version
+    
+    def refresh_demo_hierarchy(self, n_symbols, part_modifiee=0.05):
+        """Univers synthétique: seule une fraction des cotations change à chaque rafraîchissement"""
+        rng = np.random.default_rng()
+        
+        if self.demo_hierarchy is None or len(self.demo_hierarchy.symboles) != n_symbols:
+            secteurs = [(secteur, sous_secteur) for secteur, sous_secteurs in DEMO_SECTEURS.items() 
+                        for sous_secteur in sous_secteurs]
+            universe = {
+                f"DEMO{k:04d}": {'secteur': secteurs[k % len(secteurs)][0], 
+                                 'sous_secteur': secteurs[k % len(secteurs)][1]}
+                for k in range(n_symbols)
+            }
+            self.demo_hierarchy = MarketHierarchy(universe)
+            self.demo_quotes = {symbole: [rng.lognormal(24, 1.5), 0.0, rng.lognormal(13, 1)] 
+                                for symbole in universe}
+            changed = list(universe.keys())
+        else:
+            symboles = self.demo_hierarchy.symboles
+            changed = [symboles[k] for k in rng.choice(len(symboles), max(1, int(len(symboles) * part_modifiee)), 
+                                                        replace=False)]
+        
+        for symbole in changed:
+            quote = self.demo_quotes[symbole]
+            rendement = rng.normal(0, 0.5)
+            quote[0] *= 1 + rendement / 100
+            quote[1] += rendement
+            quote[2] += rng.lognormal(8, 1)
+            self.demo_hierarchy.update(symbole, quote[0], quote[1], quote[2])
+        
+        return self.demo_hierarchy
+    
+    def create_hierarchy_treemap(self, hierarchy):
+        """Carte thermique Marché → secteur → sous-secteur → symbole, taille = capitalisation"""
+        variation = hierarchy.variation()
+        
+        fig = go.Figure(go.Treemap(
+            ids=hierarchy.ids,
+            labels=hierarchy.labels,
+            parents=hierarchy.parents,
+            values=hierarchy.cap,
+            branchvalues='total',
+            # Au-delà de quelques dizaines de symboles, on n'affiche que deux niveaux sous la racine
+            maxdepth=-1 if len(hierarchy.symboles) <= 50 else 3,
+            customdata=np.column_stack([variation, hierarchy.volume]),
+            hovertemplate="<b>%{label}</b><br>Capitalisation: %{value:.3s}$<br>"
+                          "Variation: %{customdata[0]:+.2f}%<br>Volume: %{customdata[1]:,.0f}<extra></extra>",
+            marker=dict(colors=variation, colorscale='RdYlGn', cmid=0, 
+                        colorbar=dict(title='Var. %'))
+        ))
+        fig.update_layout(title='Carte Thermique Hiérarchique (taille = capitalisation)', 
+                          height=500, margin=dict(t=50, l=10, r=10, b=10))
+        return fig
+    
+    def create_anomaly_panel(self):
+        """Panneau des anomalies détectées en flux (pics de rendement et de volume)"""
+        st.markdown('<h3 class="section-header">🚨 ANOMALIES EN TEMPS RÉEL</h3>', 
+                   unsafe_allow_html=True)
+        
+        detector = self.anomaly_detector
+        detector.threshold = st.slider("Seuil de z-score", min_value=2.0, max_value=8.0, 
+                                       value=float(detector.threshold), step=0.5)
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("### 📋 Dernières alertes")
+            if detector.anomalies:
+                anomalies = pd.DataFrame(list(detector.anomalies)[::-1])
+                anomalies['heure'] = anomalies['heure'].apply(lambda h: h.strftime('%H:%M:%S'))
+                st.dataframe(anomalies.round(2), use_container_width=True, hide_index=True)
+            else:
+                barres = int(detector.count.min()) if len(detector.count) else 0
+                st.info(f"Aucune anomalie détectée • chauffe: {min(barres, detector.warmup)}/{detector.warmup} barres d'une minute")
+        
+        with col2:
+            st.markdown("### 📊 Z-scores courants")
+            scores = detector.scores()
+            fig = go.Figure()
+            fig.add_trace(go.Bar(x=scores.index, y=scores['z_rendement'], name='Rendement', marker_color='#4285F4'))
+            fig.add_trace(go.Bar(x=scores.index, y=scores['z_volume'], name='Volume', marker_color='#FBBC05'))
+            fig.add_hline(y=detector.threshold, line_dash="dash", line_color="red")
+            fig.add_hline(y=-detector.threshold, line_dash="dash", line_color="red")
+            fig.update_layout(barmode='group', height=400, title='Z-score de la dernière barre (EWMA)')
+            st.plotly_chart(fig, use_container_width=True)
+    
+    def create_replay_panel(self):
+        """Mode replay: rejoue une séance enregistrée en accéléré pour mesurer le débit du pipeline"""
+        st.markdown('<h3 class="section-header">🧪 REPLAY ACCÉLÉRÉ DE SÉANCE</h3>', 
+                   unsafe_allow_html=True)
+        
+        replay = MarketReplay(self)
+        days = replay.session_days()
+        if not days:
+            st.warning("Aucune séance enregistrée disponible")
+            return
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            day = st.selectbox("Séance à rejouer:", days[::-1], format_func=lambda d: d.strftime('%d/%m/%Y'))
+        with col2:
+            speeds = st.multiselect("Vitesses:", list(REPLAY_SPEEDS.keys()), default=['10x', '100x', 'Maximum'])
+        with col3:
+            max_duration = st.slider("Durée max par vitesse (s)", min_value=5, max_value=120, value=20)
+        
+        if st.button("▶️ Lancer le replay") and speeds:
+            results = []
+            progress = st.progress(0.0)
+            for k, speed in enumerate(speeds):
+                with st.spinner(f"Replay {speed}..."):
+                    result = replay.run(day, REPLAY_SPEEDS[speed], max_duration)
+                if result:
+                    results.append(result)
+                progress.progress((k + 1) / len(speeds))
+            
+            self.replay_results = results
+        
+        results = self.replay_results
+        if results:
+            st.dataframe(pd.DataFrame(results).set_index('vitesse').round(2), use_container_width=True)
+            
+            # La saturation apparaît quand les mises à jour appliquées cessent de suivre les ticks offerts
+            fig = make_subplots(specs=[[{"secondary_y": True}]])
+            labels = [r['vitesse'] for r in results]
+            fig.add_trace(go.Bar(x=labels, y=[r['ticks_offerts_par_seconde'] for r in results], 
+                                 name='Ticks offerts/s', marker_color='#9AA0A6'))
+            fig.add_trace(go.Bar(x=labels, y=[r['mises_a_jour_par_seconde'] for r in results], 
+                                 name='Mises à jour appliquées/s', marker_color='#4285F4'))
+            fig.add_trace(go.Scatter(x=labels, y=[r['latence_p95_ms'] for r in results], 
+                                     name='Latence p95 (ms)', line=dict(color='#EA4335')), secondary_y=True)
+            fig.update_layout(title='Débit soutenu et latence par vitesse de replay', height=400)
+            st.plotly_chart(fig, use_container_width=True)
+        
+        st.markdown("### ⚡ Indicateurs: calcul série vs calcul en lot")
+        n_symbols = st.slider("Taille de l'univers (symboles)", min_value=10, max_value=1000, value=500, step=10)
+        if st.button("⏱️ Mesurer l'accélération"):
+            with st.spinner("Calcul en cours..."):
+                result = self.benchmark_indicators(n_symbols)
+            if result:
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Chemin série", f"{result['serie_ms']:,.0f} ms")
+                col2.metric("Calcul en lot", f"{result['lot_ms']:,.0f} ms")
+                col3.metric("Accélération", f"x{result['acceleration']:.1f}")
+                col4.metric("Résultats identiques", "✅ Oui" if result['identique'] else "❌ Non",
+                            f"écart max {result['ecart_max']:.2e}", delta_color="off")
     
     def create_sidebar_controls(self):
         """Crée les contrôles de la sidebar"""
@@ -708,15 +1946,37 @@ class RealTimeGAFAMDashboard:
         
         # Paramètres de mise à jour
         st.sidebar.markdown("### ⚡ Fréquence de mise à jour")
-        update_freq = st.sidebar.slider("Secondes entre mises à jour", 
-                                       min_value=5, max_value=60, value=10)
+        self.ingestion_mode = st.sidebar.radio("Mode d'ingestion", ['Polling', 'Streaming'], 
+                                              horizontal=True)
+        if self.ingestion_mode == 'Streaming':
+            update_freq = self.create_streaming_controls()
+        else:
+            self.stop_test_feed()
+            self.stop_stream_consumer()
+            update_freq = st.sidebar.slider("Secondes entre mises à jour", 
+                                           min_value=5, max_value=60, value=10)
+            adaptive = st.sidebar.checkbox("🧠 Planification adaptative", value=True,
+                                           help="Pas de requêtes marché fermé; symboles actifs rafraîchis plus souvent")
+            budget = st.sidebar.slider("Budget de requêtes / minute", 
+                                      min_value=10, max_value=300, value=60)
+            self.scheduler.configure(update_freq, budget, adaptive)
+        
+        calendar = self.scheduler.calendar
+        if calendar.is_open():
+            st.sidebar.success("🟢 Marché ouvert (NYSE/NASDAQ)")
+        else:
+            attente = int(calendar.seconds_until_open())
+            st.sidebar.info(f"🌙 Marché fermé • réouverture dans {attente // 3600}h{attente % 3600 // 60:02d}")
+        if not calendar.covers():
+            st.sidebar.warning(f"⚠️ Calendrier des jours fériés à jour jusqu'en {calendar.LAST_YEAR} seulement: "
+                               "les fériés et séances écourtées suivants sont traités comme des jours ouvrés")
         
         # Alertes de prix
         st.sidebar.markdown("### 🔔 Alertes de Prix")
         if not self.current_data.empty:
             alert_stock = st.sidebar.selectbox("Action à surveiller:", 
                                              list(self.entreprises.keys()))
-            current_price = self.current_data[self.current_data['symbole'] == alert_stock]['prix_actuel'].iloc[0]
+            current_price = self.live_state.price(alert_stock, 0.0)
             alert_price = st.sidebar.number_input("Prix d'alerte ($)", 
                                                 min_value=0.0, 
                                                 value=float(current_price))
@@ -738,26 +1998,24 @@ class RealTimeGAFAMDashboard:
         }
         
         for indice_name, indice_ticker in indices.items():
-            try:
-                indice_data = yf.Ticker(indice_ticker)
-                hist = indice_data.history(period='1d', interval='1m')
-                if not hist.empty:
-                    valeur = hist['Close'].iloc[-1]
-                    ouverture = hist['Open'].iloc[0]
-                    variation = ((valeur - ouverture) / ouverture) * 100
-                    
-                    st.sidebar.metric(
-                        indice_name,
-                        f"{valeur:,.0f}",
-                        f"{variation:+.2f}%"
-                    )
-            except:
+            quote = self.get_index_quote(indice_ticker)
+            if quote:
+                valeur, variation = quote
+                st.sidebar.metric(
+                    indice_name,
+                    f"{valeur:,.0f}",
+                    f"{variation:+.2f}%"
+                )
+            else:
                 st.sidebar.write(f"{indice_name}: Chargement...")
         
         return update_freq
 
     def run_dashboard(self):
         """Exécute le dashboard temps réel"""
+        # Historique et indicateurs: rafraîchis à chaque nouvelle barre de 5 minutes
+        self.initialize_historical_data()
+        
         # Header
         self.display_header()
         
@@ -768,11 +2026,13 @@ class RealTimeGAFAMDashboard:
         update_freq = self.create_sidebar_controls()
         
         # Navigation par onglets
-        tab1, tab2, tab3, tab4 = st.tabs([
+        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
             "📊 Tableau Live", 
             "📈 Graphiques", 
             "🌍 Vue Marché",
-            "⚙️ Paramètres"
+            "🚨 Anomalies",
+            "⚙️ Paramètres",
+            "🧪 Replay"
         ])
         
         with tab1:
@@ -785,6 +2045,9 @@ class RealTimeGAFAMDashboard:
             self.create_market_overview()
         
         with tab4:
+            self.create_anomaly_panel()
+        
+        with tab5:
             st.markdown("## ⚙️ PARAMÈTRES TEMPS RÉEL")
             
             col1, col2 = st.columns(2)
@@ -801,18 +2064,52 @@ class RealTimeGAFAMDashboard:
             
             with col2:
                 st.markdown("### 📡 Statut des données")
-                st.write("**Source:** Yahoo Finance API")
-                st.write("**Latence:** 1-2 minutes")
-                st.write("**Couverture:** Données intraday")
-                st.write("**Période:** Données minute par minute")
+                if self.ingestion_mode == 'Streaming' and self.stream_consumer:
+                    latences = self.stream_stats['latence_ms']
+                    st.write(f"**Source:** Flux poussé ({self.stream_consumer.url})")
+                    st.write(f"**Ticks appliqués:** {self.stream_stats['ticks']:,}")
+                    if latences:
+                        st.write(f"**Latence transaction → écran:** médiane {np.median(latences):.0f} ms, "
+                                 f"max {max(latences):.0f} ms")
+                    st.write(f"**Regroupement UI:** toutes les {update_freq} secondes")
+                else:
+                    st.write("**Source:** Yahoo Finance API")
+                    st.write("**Latence:** 1-2 minutes")
+                    st.write("**Couverture:** Données intraday")
+                    st.write("**Période:** Données minute par minute")
+                    st.write(f"**Requêtes de cotation effectuées:** {self.scheduler.requests_made:,}")
+                    
+                    intervals = self.scheduler.intervals()
+                    if self.scheduler.enabled and intervals:
+                        if max(intervals.values()) > self.scheduler.max_interval:
+                            st.caption(f"⚠️ Budget de {self.scheduler.budget_per_minute} requêtes/minute atteint: "
+                                       f"certains intervalles dépassent le maximum de {self.scheduler.max_interval} s")
+                        st.dataframe(pd.DataFrame({
+                            'Intervalle (s)': intervals,
+                            'Activité (%)': {s: a * 100 for s, a in self.scheduler.activity.items()}
+                        }).round(3), use_container_width=True)
+        
+        with tab6:
+            self.create_replay_panel()
         
         # Mise à jour automatique
         if auto_refresh:
-            time.sleep(update_freq)
-            self.update_live_data()
+            if self.ingestion_mode == 'Streaming' and self.stream_consumer:
+                # Les ticks arrivent en continu: on applique le lot accumulé pendant l'intervalle
+                time.sleep(update_freq)
+                self.apply_stream_events(self.stream_consumer.drain())
+            else:
+                # Le planificateur décide de l'attente et des symboles à interroger
+                time.sleep(self.scheduler.sleep_seconds(self.entreprises.keys()))
+                due = self.scheduler.due_symbols(self.entreprises.keys())
+                if due:
+                    self.update_live_data(due)
             st.rerun()
 
 # Lancement du dashboard
 if __name__ == "__main__":
-    dashboard = RealTimeGAFAMDashboard()
+    # Conserver l'état entre les reruns pour ne pas tout recharger à chaque rafraîchissement
+    if 'dashboard' not in st.session_state:
+        st.session_state.dashboard = RealTimeGAFAMDashboard()
+    dashboard = st.session_state.dashboard
     dashboard.run_dashboard()
\ No newline at end of file